@@ -1,14 +1,52 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-import subprocess
+from fastapi import FastAPI, HTTPException
+import asyncio
+import errno
+import functools
+import hashlib
+import io
+import itertools
+import json
 import os
+import re
+import shutil
+import socket
+import tempfile
+import zipfile
 from string import Template
+import httpx
+from pypdf import PdfReader, PdfWriter
 from pydantic import BaseModel
-from typing import Literal, Optional
+from typing import Callable, Literal, Optional
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, Response
+from starlette.background import BackgroundTask
 
 OUTPUT_DIR = "test"
+CACHE_DIR = os.path.join(OUTPUT_DIR, ".cache")
+WORK_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None  # RAM-backed scratch space
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_BYTES = 1024 * 1024 * 1024
+PANDOC_TIMEOUT = 30
+LATEX_TIMEOUT = 30
+FORMAT_TIMEOUT = 120
+PANDOC_SERVER_ATTEMPTS = 3
+FORMAT_DIR = "/app/fmt"  # prebuilt at image build time, see Dockerfile
+MAX_ERROR_LOGS = 100
+MAX_MD_BYTES = 1024 * 1024
+MAX_BATCH_DOCUMENTS = 16
+# Counters pandoc's article output numbers; reset between batched documents.
+BATCH_COUNTER_RESET = "".join(
+    f"\\setcounter{{{counter}}}{{0}}\n"
+    for counter in (
+        "section", "subsection", "subsubsection", "paragraph", "subparagraph",
+        "footnote", "mpfootnote", "equation", "figure", "table",
+    )
+)
+MAX_RAW_LATEX_COMMANDS = 5000
+_RAW_LATEX = re.compile(rb"\\[a-zA-Z]+")
+# Under gunicorn each worker process gets its share of the CPUs for pdflatex.
+LATEX_JOBS = max(1, (os.cpu_count() or 1) // int(os.environ.get("WEB_CONCURRENCY", "1")))
 
 app = FastAPI(
     title="CheatMark", description="Convert markdown files to PDF cheat sheets"
@@ -39,6 +77,11 @@ class ConversionRequest(BaseModel):
     template_config: Optional[TemplateConfig] = None
 
 
+class BatchConversionRequest(BaseModel):
+    documents: list[str]
+    template_config: Optional[TemplateConfig] = None
+
+
 class ConversionResponse(BaseModel):
     status: str
     message: str
@@ -47,7 +90,31 @@ class ConversionResponse(BaseModel):
 
 
 def getFileName(path: str) -> str:
-    return os.path.basename(path).split(".")[0]
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _file_prefix() -> str:
+    # pids repeat across container restarts, so a few random bytes taken once
+    # per process keep names (and the error logs kept in OUTPUT_DIR) unique.
+    return f"cheatsheet_{os.getpid()}_{os.urandom(3).hex()}"
+
+
+_file_counter = itertools.count()
+_file_name_prefix = _file_prefix()
+
+
+def _reset_file_counter():
+    # gunicorn --preload imports this module before forking the workers
+    global _file_counter, _file_name_prefix
+    _file_counter = itertools.count()
+    _file_name_prefix = _file_prefix()
+
+
+os.register_at_fork(after_in_child=_reset_file_counter)
+
+
+def new_file_name() -> str:
+    return f"{_file_name_prefix}_{next(_file_counter):x}"
 
 
 def get_template_path(file_name: str) -> str:
@@ -55,100 +122,537 @@ def get_template_path(file_name: str) -> str:
     return os.path.join("/app/template", file_name)
 
 
-def render_latex(
-    file_name: str, template_config: TemplateConfig, errors: list[str]
-) -> list[str]:
-    pandoc_command = [
-        "pandoc",
-        "--from=markdown",
-        f"--output={file_name}_temp.tex",
-        f"{file_name}.md",
-    ]
-    result = subprocess.run(
-        pandoc_command, capture_output=True, text=True, encoding="utf-8", cwd=OUTPUT_DIR
+@functools.lru_cache(maxsize=1)
+def _load_header_template() -> Template:
+    with open(get_template_path("HEADER.txt"), "r", encoding="utf-8") as header_file:
+        return Template(header_file.read())
+
+
+@functools.lru_cache(maxsize=1)
+def _load_footer_template() -> Template:
+    with open(get_template_path("FOOTER.txt"), "r", encoding="utf-8") as footer_file:
+        return Template(footer_file.read())
+
+
+@functools.lru_cache(maxsize=1)
+def _template_digest() -> bytes:
+    # Covers every file in the template directory, including def.tex which
+    # HEADER.txt pulls in with \input.
+    digest = hashlib.blake2b(digest_size=16)
+    template_dir = get_template_path("")
+    for name in sorted(os.listdir(template_dir)):
+        path = os.path.join(template_dir, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, "rb") as template_file:
+            data = template_file.read()
+        digest.update(f"{name}\0{len(data)}\0".encode("utf-8"))
+        digest.update(data)
+    return digest.digest()
+
+
+@functools.lru_cache(maxsize=64)
+def _render_template(template: Template, data: tuple[tuple[str, str], ...]) -> bytes:
+    # Most requests reuse a handful of configs, so the substituted and
+    # encoded output is cached rather than rebuilt per conversion.
+    return template.substitute(dict(data)).encode("utf-8")
+
+
+def get_template_data(template_config: TemplateConfig) -> dict:
+    # Plain attribute reads; model_dump() walks pydantic's serializer for seven strings.
+    return {
+        "fontSize": template_config.fontSize,
+        "lineSpacing": template_config.lineSpacing,
+        "columnNum": template_config.columnNum,
+        "orientation": template_config.orientation,
+        "columnSep": template_config.columnSep,
+        "upDown": template_config.upDown,
+        "leftRight": template_config.leftRight,
+    }
+
+
+def get_header_data(template_data: dict) -> dict:
+    header_data = dict(template_data)
+    header_data["if_multicol_start"] = (
+        "\\begin{multicols*}{" + header_data["columnNum"] + "}"
+        if int(header_data["columnNum"]) > 1
+        else ""
     )
-    if result.returncode != 0:
-        errors.append(f"Pandoc error: {result.stderr}")
+    return header_data
+
+
+def get_footer_data(template_data: dict) -> dict:
+    return {
+        "if_multicol_end": "\\end{multicols*}"
+        if int(template_data["columnNum"]) > 1
+        else ""
+    }
+
+
+async def run_subprocess(
+    command: list[str],
+    timeout: float,
+    cwd: Optional[str] = None,
+    env: Optional[dict] = None,
+    input: Optional[bytes] = None,
+    capture_stdout: bool = True,
+) -> tuple[int, bytes, bytes]:
+    proc = await asyncio.create_subprocess_exec(
+        *command,
+        cwd=cwd,
+        env=env,
+        stdin=asyncio.subprocess.PIPE if input is not None else None,
+        stdout=asyncio.subprocess.PIPE if capture_stdout else asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(input), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise TimeoutError(f"{command[0]} timed out after {timeout} seconds")
 
-    if not os.path.exists(os.path.join(OUTPUT_DIR, f"{file_name}_temp.tex")):
-        errors.append(f"Pandoc failed to create file {file_name}.tex")
-        return errors
+    return proc.returncode, stdout or b"", stderr
 
-    create_final_tex(file_name, template_config, errors)
-    return errors
 
+def render_preamble() -> str:
+    return _load_header_template().substitute(
+        get_header_data(get_template_data(TemplateConfig()))
+    )
 
-def create_final_tex(
-    file_name: str, template_config: TemplateConfig, errors: list[str]
-) -> list[str]:
+
+def format_stamp(preamble: str) -> str:
+    # The format bakes in everything HEADER.txt reads before \endofdump,
+    # def.tex included, so the whole template directory goes into the stamp.
+    stamp = hashlib.blake2b(_template_digest(), digest_size=16)
+    stamp.update(preamble.encode("utf-8"))
+    return stamp.hexdigest()
+
+
+def _read_text(path: str) -> Optional[str]:
     try:
-        with open(
-            os.path.join(OUTPUT_DIR, f"{file_name}.tex"), "w", encoding="utf-8"
-        ) as final_tex:
-            header_path = get_template_path("HEADER.txt")
-            try:
-                with open(header_path, "r", encoding="utf-8") as header_file:
-                    header_template = Template(header_file.read())
-                    header_data = template_config.model_dump()
-                    header_data["if_multicol_start"] = (
-                        "\\begin{multicols*}{" + header_data["columnNum"] + "}"
-                        if int(header_data["columnNum"]) > 1
-                        else ""
-                    )
-                    final_tex.write(header_template.substitute(header_data))
-            except FileNotFoundError:
-                errors.append(f"Template file not found: {header_path}")
-                return errors
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
 
+
+async def build_format(fmt_dir: str, preamble: Optional[str] = None) -> bool:
+    """Dumps the static part of HEADER.txt into fmt_dir/cheatmark.fmt."""
+    if preamble is None:
+        preamble = render_preamble()
+    try:
+        os.makedirs(fmt_dir, exist_ok=True)
+        with open(os.path.join(fmt_dir, "cheatmark.tex"), "w", encoding="utf-8") as f:
+            f.write(preamble)
+
+        returncode, _, _ = await run_subprocess(
+            [
+                "pdflatex",
+                "-ini",
+                "-interaction=batchmode",
+                "-jobname=cheatmark",
+                "&pdflatex",
+                "mylatexformat.ltx",
+                "cheatmark.tex",
+            ],
+            FORMAT_TIMEOUT,
+            cwd=fmt_dir,
+            env={**os.environ, "TEXINPUTS": get_template_path("") + os.pathsep},
+            capture_stdout=False,
+        )
+    except (OSError, TimeoutError) as e:
+        print(f"Error building LaTeX format: {e}")
+        return False
+
+    if returncode != 0 or not os.path.exists(os.path.join(fmt_dir, "cheatmark.fmt")):
+        print(
+            f"Error building LaTeX format (Return Code {returncode}), "
+            f"see {os.path.join(fmt_dir, 'cheatmark.log')}"
+        )
+        return False
+
+    # Kept next to the format so a stale one can be detected at startup.
+    try:
+        with open(os.path.join(fmt_dir, "cheatmark.stamp"), "w", encoding="utf-8") as f:
+            f.write(format_stamp(preamble))
+    except OSError as e:
+        print(f"Error writing LaTeX format stamp: {e}")
+    return True
+
+
+class LatexWorker:
+    """Runs pdflatex against a format with the static HEADER.txt preamble preloaded."""
+
+    def __init__(self, max_jobs: int, max_queue: int):
+        self.fmt_dir: Optional[str] = None
+        self.owns_fmt_dir = False
+        self.fmt_name: Optional[str] = None
+        self.semaphore = asyncio.Semaphore(max_jobs)
+        self.max_queue = max_queue
+        self.waiting = 0
+        self.env = {
+            **os.environ,
+            "TEXINPUTS": get_template_path("") + os.pathsep,
+        }
+
+    async def start(self):
+        # Everything in HEADER.txt up to \endofdump is dumped into cheatmark.fmt,
+        # so per-request runs skip straight to the config-dependent part.
+        preamble = render_preamble()
+        stamp = _read_text(os.path.join(FORMAT_DIR, "cheatmark.stamp"))
+        if stamp == format_stamp(preamble) and os.path.exists(
+            os.path.join(FORMAT_DIR, "cheatmark.fmt")
+        ):
+            self.fmt_dir = FORMAT_DIR
+            self._use_format(FORMAT_DIR)
+            return
+
+        # No format baked into the image, or the templates changed since it
+        # was built: each worker process builds into its own directory.
+        self.fmt_dir = tempfile.mkdtemp(prefix="cheatmark_fmt_")
+        self.owns_fmt_dir = True
+        if await build_format(self.fmt_dir, preamble):
+            self._use_format(self.fmt_dir)
+
+    def _use_format(self, fmt_dir: str):
+        self.env["TEXFORMATS"] = fmt_dir + os.pathsep
+        self.fmt_name = "cheatmark"
+
+    async def stop(self):
+        if self.fmt_dir is not None and self.owns_fmt_dir:
+            await asyncio.to_thread(shutil.rmtree, self.fmt_dir, ignore_errors=True)
+        self.fmt_dir = None
+        self.fmt_name = None
+
+    async def compile(self, file_name: str, cwd: str) -> tuple[int, bytes]:
+        # batchmode keeps pdflatex silent; on failure the details are in the .log.
+        pdflatex_command = [
+            "pdflatex",
+            "-synctex=0",
+            "-interaction=batchmode",
+            "-no-shell-escape",
+            "-file-line-error",
+        ]
+        if self.fmt_name:
+            pdflatex_command.append(f"-fmt={self.fmt_name}")
+        pdflatex_command.append(f"{file_name}.tex")
+
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            return await self._run(pdflatex_command, cwd=cwd, timeout=LATEX_TIMEOUT)
+        finally:
+            self.semaphore.release()
+
+    @property
+    def busy(self) -> bool:
+        return self.waiting >= self.max_queue
+
+    async def _run(
+        self, command: list[str], cwd: str, timeout: float
+    ) -> tuple[int, bytes]:
+        returncode, _, stderr = await run_subprocess(
+            command, timeout, cwd=cwd, env=self.env, capture_stdout=False
+        )
+        return returncode, stderr
+
+
+_inflight: dict[str, asyncio.Future] = {}  # cache key -> running conversion
+
+latex_worker = LatexWorker(max_jobs=LATEX_JOBS, max_queue=4 * LATEX_JOBS)
+
+
+class PandocServer:
+    """Keeps a `pandoc server` process running so conversions skip pandoc's startup."""
+
+    def __init__(self):
+        self.port: Optional[int] = None
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        # One server per worker process, each on its own free port. pandoc
+        # server has no host option and listens on all interfaces, so outside
+        # the container the port must not be reachable from other machines.
+        # Another worker can grab the port between picking and binding it;
+        # pandoc then exits and the next attempt picks a new one.
+        for _ in range(PANDOC_SERVER_ATTEMPTS):
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                self.port = sock.getsockname()[1]
             try:
-                with open(
-                    os.path.join(OUTPUT_DIR, f"{file_name}_temp.tex"), "r", encoding="utf-8"
-                ) as content_file:
-                    final_tex.write(content_file.read())
-            except FileNotFoundError:
-                errors.append(f"Content file not found: {file_name}.tex")
-                return errors
-
-            footer_path = get_template_path("FOOTER.txt")
-            try:
-                with open(footer_path, "r", encoding="utf-8") as footer_file:
-                    footer_template = Template(footer_file.read())
-                    footer_data = {
-                        "if_multicol_end": "\\end{multicols*}" 
-                        if int(template_config.columnNum) > 1 
-                        else ""
-                    }
-                    final_tex.write(footer_template.substitute(footer_data))
-            except FileNotFoundError:
-                errors.append(f"Template file not found: {footer_path}")
-                return errors
+                self.proc = await asyncio.create_subprocess_exec(
+                    "pandoc",
+                    "server",
+                    "--port",
+                    str(self.port),
+                    "--timeout",
+                    str(PANDOC_TIMEOUT),
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL,
+                )
+            except OSError as e:
+                print(f"Error starting pandoc server: {e}")
+                return
+
+            client = httpx.AsyncClient(
+                base_url=f"http://127.0.0.1:{self.port}", timeout=PANDOC_TIMEOUT
+            )
+            for _ in range(50):
+                if self.proc.returncode is not None:
+                    break
+                try:
+                    (await client.get("/version")).raise_for_status()
+                except httpx.HTTPError:
+                    await asyncio.sleep(0.1)
+                    continue
+                self.client = client
+                return
+            await client.aclose()
+            await self.stop()
+
+        # pandoc < 3.0 has no server mode; conversions fall back to subprocesses.
+        print("pandoc server unavailable, falling back to pandoc subprocesses")
+
+    async def stop(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.terminate()
+            await self.proc.wait()
+
+    @property
+    def running(self) -> bool:
+        return (
+            self.client is not None
+            and self.proc is not None
+            and self.proc.returncode is None
+        )
+
+
+pandoc_server = PandocServer()
+
+
+async def run_pandoc(content: bytes, errors: list[str]) -> Optional[bytes]:
+    # pandoc's raw TeX reader is its slow path; skip it when there is nothing for it to read.
+    from_format = "markdown" if _RAW_LATEX.search(content) else "markdown-raw_tex"
+    output = None
+    if pandoc_server.running:
+        try:
+            response = await pandoc_server.client.post(
+                "/",
+                json={"text": content.decode("utf-8"), "from": from_format, "to": "latex"},
+                headers={"Accept": "application/json"},
+            )
+        except httpx.TimeoutException:
+            errors.append(f"Pandoc error: timed out after {PANDOC_TIMEOUT} seconds")
+            return None
+        except httpx.TransportError as e:
+            # The server died or stopped answering; a subprocess still works.
+            print(f"pandoc server unreachable, using a pandoc subprocess: {e!r}")
+            response = None
+        except httpx.HTTPError as e:
+            errors.append(f"Pandoc error: {e}")
+            return None
+        if response is not None:
+            if response.status_code != 200:
+                errors.append(f"Pandoc error: {response.text}")
+                return None
+            output = response.json()["output"].encode("utf-8")
+
+    if output is None:
+        returncode, output, stderr = await run_subprocess(
+            ["pandoc", f"--from={from_format}", "--to=latex"],
+            PANDOC_TIMEOUT,
+            input=content,
+        )
+        if returncode != 0:
+            errors.append(f"Pandoc error: {stderr.decode('utf-8', errors='replace')}")
+            return None
+
+    # An empty body would only make pdflatex fail with "No pages of output".
+    if not output.strip():
+        errors.append("Pandoc produced no output")
+        return None
+    return output
+
+
+async def _load_template_async(
+    loader: Callable[[], Template], errors: list[str]
+) -> Optional[Template]:
+    try:
+        if loader.cache_info().currsize:
+            return loader()
+        return await asyncio.to_thread(loader)
+    except FileNotFoundError as e:
+        errors.append(f"Template file not found: {e.filename}")
+        return None
+
+
+async def render_latex(
+    file_name: str,
+    workdir: str,
+    content: bytes,
+    template_data: dict,
+    errors: list[str],
+) -> bool:
+    # Pandoc output doesn't depend on the templates until concatenation,
+    # so template loading overlaps with the pandoc run.
+    body, header_template, footer_template = await asyncio.gather(
+        run_pandoc(content, errors),
+        _load_template_async(_load_header_template, errors),
+        _load_template_async(_load_footer_template, errors),
+    )
+    if body is None or header_template is None or footer_template is None:
+        return False
+
+    return await asyncio.to_thread(
+        create_final_tex,
+        file_name,
+        workdir,
+        body,
+        header_template,
+        footer_template,
+        template_data,
+        errors,
+    )
+
 
+async def render_batch_latex(
+    file_name: str,
+    workdir: str,
+    contents: list[bytes],
+    template_data: dict,
+    errors: list[str],
+) -> bool:
+    document_errors = [[] for _ in contents]
+    *bodies, header_template, footer_template = await asyncio.gather(
+        *(
+            run_pandoc(content, doc_errors)
+            for content, doc_errors in zip(contents, document_errors)
+        ),
+        _load_template_async(_load_header_template, errors),
+        _load_template_async(_load_footer_template, errors),
+    )
+    # Numbered like the PDFs in the returned zip.
+    for index, doc_errors in enumerate(document_errors, start=1):
+        errors.extend(f"Document {index}: {error}" for error in doc_errors)
+    if None in bodies or header_template is None or footer_template is None:
+        return False
+
+    # Each document starts on a fresh page; the number of pages shipped out
+    # before it is written to {file_name}.pages so the PDF can be split later.
+    # Numbering restarts too, so each PDF matches what /convert would produce.
+    separator = (
+        f"\n{get_footer_data(template_data)['if_multicol_end']}\n"
+        "\\clearpage\n"
+        "\\immediate\\write\\cheatmarkpages{\\the\\ReadonlyShipoutCounter}\n"
+        "\\setcounter{page}{1}\n"
+        f"{BATCH_COUNTER_RESET}"
+        f"{get_header_data(template_data)['if_multicol_start']}\n"
+    ).encode("utf-8")
+    body = (
+        b"\\newwrite\\cheatmarkpages\n"
+        b"\\immediate\\openout\\cheatmarkpages=\\jobname.pages\n"
+        + separator.join(bodies)
+    )
+
+    return await asyncio.to_thread(
+        create_final_tex,
+        file_name,
+        workdir,
+        body,
+        header_template,
+        footer_template,
+        template_data,
+        errors,
+    )
+
+
+def split_pdf(pdf_path: str, pages_path: str, count: int) -> list[bytes]:
+    with open(pages_path, "r", encoding="utf-8") as pages_file:
+        boundaries = [int(line) for line in pages_file if line.strip()]
+    if len(boundaries) != count - 1:
+        raise Exception(
+            f"Expected {count - 1} document boundaries in {pages_path}, found {len(boundaries)}"
+        )
+
+    reader = PdfReader(pdf_path)
+    pdfs = []
+    for start, end in zip([0] + boundaries, boundaries + [len(reader.pages)]):
+        writer = PdfWriter()
+        for page_number in range(start, end):
+            writer.add_page(reader.pages[page_number])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        pdfs.append(buffer.getvalue())
+    return pdfs
+
+
+def create_final_tex(
+    file_name: str,
+    workdir: str,
+    content: bytes,
+    header_template: Template,
+    footer_template: Template,
+    template_data: dict,
+    errors: list[str],
+) -> bool:
+    header = _render_template(
+        header_template, tuple(sorted(get_header_data(template_data).items()))
+    )
+    footer = _render_template(
+        footer_template, tuple(get_footer_data(template_data).items())
+    )
+
+    tex_path = os.path.join(workdir, f"{file_name}.tex")
+    try:
+        fd = os.open(tex_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            parts = [header, content, footer]
+            written = os.writev(fd, parts)
+            if written < sum(map(len, parts)):
+                # Short write, e.g. on a nearly full tmpfs: finish it, or let
+                # os.write raise the real error instead of compiling a cut-off file.
+                remaining = memoryview(b"".join(parts))[written:]
+                while remaining:
+                    remaining = remaining[os.write(fd, remaining):]
+        finally:
+            os.close(fd)
     except Exception as e:
         errors.append(f"File operation error: {str(e)}")
+        # Don't leave a truncated .tex behind for anything to compile.
+        try:
+            os.unlink(tex_path)
+        except OSError:
+            pass
+        return False
 
-    return errors
+    return True
 
 
-def render_pdf(file_name: str, errors: list[str]) -> list[str]:
-    pdflatex_command = [
-        "pdflatex",
-        "-synctex=1",
-        "-interaction=nonstopmode",
-        "-file-line-error",
-        f"{file_name}.tex",
-    ]
-
-    result = subprocess.run(
-        pdflatex_command,
-        cwd=OUTPUT_DIR,
-        text=True,
-        encoding="utf-8",
-        capture_output=True,
-        timeout=30,
-    )
+def read_latex_log(log_path: str) -> str:
+    try:
+        with open(log_path, "r", encoding="utf-8", errors="replace") as log_file:
+            return log_file.read()
+    except FileNotFoundError:
+        return ""
+
 
-    if result.returncode != 0:
-        error_output = result.stderr + "\n" + result.stdout
+async def render_pdf(file_name: str, workdir: str, errors: list[str]) -> list[str]:
+    returncode, stderr = await latex_worker.compile(file_name, workdir)
+
+    if returncode != 0:
+        log = await asyncio.to_thread(
+            read_latex_log, os.path.join(workdir, f"{file_name}.log")
+        )
+
+        error_output = stderr.decode("utf-8", errors="replace") + "\n" + log
         error_msg = (
             error_output.strip()
             if error_output.strip()
@@ -156,73 +660,329 @@ def render_pdf(file_name: str, errors: list[str]) -> list[str]:
         )
 
         full_error = (
-            f"PDFLatex Error (Return Code {result.returncode}):\n"
+            f"PDFLatex Error (Return Code {returncode}):\n"
             f"Input File: {file_name}.tex\n"
             f"Error Details:\n{error_msg}"
         )
         errors.append(full_error)
 
-    if not os.path.exists(os.path.join(OUTPUT_DIR, f"{file_name}.pdf")):
+    if not await asyncio.to_thread(os.path.exists, os.path.join(workdir, f"{file_name}.pdf")):
         raise Exception(f"PDFLatex failed to create file {file_name}.pdf. Errors: {errors}")
 
     return errors
 
 
-def cleanup_files(file_name: str):
-    extensions = ['.md', '.tex', '_temp.tex', '.pdf', '_errors.log', '.aux', '.log', '.synctex.gz']
-    for ext in extensions:
+def link_or_copy(src: str, dst: str):
+    # Hardlink when possible; across filesystems (e.g. tmpfs -> disk) copy
+    # in-kernel with sendfile rather than through a userspace buffer.
+    try:
+        os.link(src, dst)
+        return
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+
+    with open(src, "rb") as src_file, open(dst, "xb") as dst_file:
         try:
-            file_path = os.path.join(OUTPUT_DIR, f"{file_name}{ext}")
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as e:
-            print(f"Error cleaning up {file_path}: {e}")
+            size = os.fstat(src_file.fileno()).st_size
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(dst_file.fileno(), src_file.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except BaseException:
+            os.remove(dst)
+            raise
+
+
+def get_cache_key(content: bytes, template_data: dict) -> str:
+    # Templates are part of the key so cached PDFs don't outlive a template change.
+    key = hashlib.blake2b(digest_size=16)
+    key.update(_template_digest())
+    key.update(json.dumps(template_data, sort_keys=True).encode("utf-8"))
+    key.update(content)
+    return key.hexdigest()
+
+
+def get_cached_pdf(cache_key: str) -> Optional[bytes]:
+    cache_path = os.path.join(CACHE_DIR, f"{cache_key}.pdf")
+    try:
+        with open(cache_path, "rb") as cached_pdf:
+            pdf = cached_pdf.read()
+    except OSError:
+        return None
 
+    try:
+        os.utime(cache_path)  # mtime doubles as last-access time for eviction
+    except OSError:
+        pass
+    return pdf
 
-@app.post("/convert")
-async def convert_to_pdf(request: ConversionRequest, background_tasks: BackgroundTasks):
-    if not request.content:
-        raise HTTPException(status_code=400, detail="Content cannot be empty")
 
-    file_name = f"cheatsheet_{os.urandom(4).hex()}"  # Generate random filename
-    template_config = request.template_config or TemplateConfig()
-    output_pdf = os.path.join(OUTPUT_DIR, f"{file_name}.pdf")
-    
-    md_file_path = os.path.join(OUTPUT_DIR, f"{file_name}.md")
+def store_cached_pdf(cache_key: str, pdf_path: str):
+    cache_path = os.path.join(CACHE_DIR, f"{cache_key}.pdf")
+    # Copy under a temporary name first so readers never see a partial file.
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        link_or_copy(pdf_path, tmp_path)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Error caching {pdf_path}: {e}")
+        return
+
+    evict_cache()
+
+
+def collect_pdf(pdf_path: str, cache_key: Optional[str]) -> bytes:
+    with open(pdf_path, "rb") as pdf_file:
+        pdf = pdf_file.read()
+    if cache_key is not None:
+        store_cached_pdf(cache_key, pdf_path)
+    return pdf
+
+
+def evict_cache():
     try:
-        with open(md_file_path, "w", encoding="utf-8") as f:
-            f.write(request.content)
+        entries = [(entry.path, entry.stat()) for entry in os.scandir(CACHE_DIR)]
+    except OSError as e:
+        print(f"Error scanning cache {CACHE_DIR}: {e}")
+        return
+
+    # Oldest first; drop entries until both the count and size limits hold.
+    entries.sort(key=lambda entry: entry[1].st_mtime)
+    count = len(entries)
+    total = sum(stat.st_size for _, stat in entries)
+    for path, stat in entries:
+        if count <= CACHE_MAX_ENTRIES and total <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Error evicting {path}: {e}")
+            continue
+        count -= 1
+        total -= stat.st_size
+
+
+async def run_conversion(
+    file_name: str, content: bytes, template_data: dict, cache_key: str
+) -> tuple[Optional[bytes], list[str]]:
+    errors = []
+    pdf = None
+    # LaTeX intermediates stay in a per-job RAM-backed directory; the
+    # finished PDF is read into memory and copied into the cache.
+    workdir = await asyncio.to_thread(tempfile.mkdtemp, prefix="cheatmark_", dir=WORK_DIR)
+    try:
+        # Without a .tex there is nothing for pdflatex to compile.
+        if await render_latex(file_name, workdir, content, template_data, errors):
+            errors = await render_pdf(file_name, workdir, errors)
+            # A PDF from a failed or killed pdflatex run may be partial: it is
+            # still returned, but not memoized.
+            pdf = await asyncio.to_thread(
+                collect_pdf,
+                os.path.join(workdir, f"{file_name}.pdf"),
+                None if errors else cache_key,
+            )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to write markdown file: {str(e)}")
+        errors.append(f"Conversion error: {str(e)}")
+    finally:
+        await asyncio.to_thread(shutil.rmtree, workdir, ignore_errors=True)
+
+    return pdf, errors
+
 
+async def run_batch_conversion(
+    file_name: str, contents: list[bytes], template_data: dict
+) -> tuple[Optional[list[bytes]], list[str]]:
     errors = []
+    pdfs = None
+    workdir = await asyncio.to_thread(tempfile.mkdtemp, prefix="cheatmark_", dir=WORK_DIR)
     try:
-        errors = render_latex(file_name, template_config, errors)
-        errors = render_pdf(file_name, errors)
+        if await render_batch_latex(file_name, workdir, contents, template_data, errors):
+            errors = await render_pdf(file_name, workdir, errors)
+            pdfs = await asyncio.to_thread(
+                split_pdf,
+                os.path.join(workdir, f"{file_name}.pdf"),
+                os.path.join(workdir, f"{file_name}.pages"),
+                len(contents),
+            )
     except Exception as e:
         errors.append(f"Conversion error: {str(e)}")
+    finally:
+        await asyncio.to_thread(shutil.rmtree, workdir, ignore_errors=True)
 
-    if errors:
-        error_log_path = os.path.join(OUTPUT_DIR, f"{file_name}_errors.log")
+    return pdfs, errors
+
+
+def write_error_log(file_name: str, errors: list[str]):
+    error_log_path = os.path.join(OUTPUT_DIR, f"{file_name}_errors.log")
+    try:
         with open(error_log_path, 'w') as error_log:
             for error in errors:
                 error_log.write(error + "\n")
+    except OSError as e:
+        print(f"Error writing {error_log_path}: {e}")
+        return
+    rotate_error_logs()
+
+
+def rotate_error_logs():
+    try:
+        logs = [
+            (entry.path, entry.stat().st_mtime)
+            for entry in os.scandir(OUTPUT_DIR)
+            if entry.name.endswith("_errors.log")
+        ]
+    except OSError as e:
+        print(f"Error scanning {OUTPUT_DIR}: {e}")
+        return
+
+    # Keep only the newest MAX_ERROR_LOGS.
+    logs.sort(key=lambda log: log[1])
+    for path, _ in logs[: max(0, len(logs) - MAX_ERROR_LOGS)]:
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Error removing {path}: {e}")
+
+
+def conversion_failed(file_name: str, detail: str, errors: list[str]) -> JSONResponse:
+    # Only failed conversions are logged, and only after the response is sent.
+    return JSONResponse(
+        status_code=500,
+        content={"detail": detail},
+        background=BackgroundTask(write_error_log, file_name, errors),
+    )
+
+
+@app.on_event("startup")
+async def preload_templates():
+    # Every conversion needs both templates, so a missing file stops startup.
+    _load_header_template()
+    _load_footer_template()
+    _template_digest()
+
+
+@app.on_event("startup")
+async def start_latex_worker():
+    await latex_worker.start()
+
+
+@app.on_event("shutdown")
+async def stop_latex_worker():
+    await latex_worker.stop()
+
+
+@app.on_event("startup")
+async def start_pandoc_server():
+    await pandoc_server.start()
+
+
+@app.on_event("shutdown")
+async def stop_pandoc_server():
+    await pandoc_server.stop()
+
+
+def validate_content(content: str) -> bytes:
+    if not content.strip():
+        raise HTTPException(status_code=400, detail="Content cannot be empty")
+    try:
+        encoded = content.encode("utf-8")
+    except UnicodeEncodeError:
+        raise HTTPException(status_code=400, detail="Content must be valid UTF-8")
+    if len(encoded) > MAX_MD_BYTES:
+        raise HTTPException(
+            status_code=413, detail=f"Content exceeds {MAX_MD_BYTES} bytes"
+        )
+    if len(_RAW_LATEX.findall(encoded)) > MAX_RAW_LATEX_COMMANDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Content contains more than {MAX_RAW_LATEX_COMMANDS} raw LaTeX commands",
+        )
+    return encoded
+
 
-    if os.path.exists(output_pdf):
-        response = FileResponse(
-            path=output_pdf,
-            filename=f"{file_name}.pdf",
-            media_type="application/pdf",
-            background=None
+@app.post("/convert")
+async def convert_to_pdf(request: ConversionRequest):
+    content = validate_content(request.content)
+
+    file_name = new_file_name()
+    template_config = request.template_config or TemplateConfig()
+    template_data = get_template_data(template_config)
+
+    cache_key = get_cache_key(content, template_data)
+    errors = []
+    pdf = await asyncio.to_thread(get_cached_pdf, cache_key)
+    if pdf is None:
+        inflight = _inflight.get(cache_key)
+        if inflight is not None:
+            # An identical conversion is already running; reuse its result.
+            pdf, errors = await asyncio.shield(inflight)
+            errors = list(errors)
+        else:
+            if latex_worker.busy:
+                raise HTTPException(status_code=503, detail="Server is busy, try again later")
+
+            future = asyncio.get_running_loop().create_future()
+            _inflight[cache_key] = future
+            try:
+                pdf, errors = await run_conversion(
+                    file_name, content, template_data, cache_key
+                )
+            finally:
+                del _inflight[cache_key]
+                future.set_result((pdf, errors))
+
+    if pdf is None:
+        return conversion_failed(
+            file_name,
+            "PDF file was not created successfully. Errors: " + "; ".join(errors),
+            errors,
         )
-        # Add cleanup as a background task
-        background_tasks.add_task(cleanup_files, file_name)
-        return response
-    else:
+
+    return Response(
+        content=pdf,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="{file_name}.pdf"'},
+    )
+
+
+@app.post("/convert_batch")
+async def convert_batch_to_pdf(request: BatchConversionRequest):
+    """Convert several documents sharing one template config in a single pdflatex run."""
+    if not request.documents:
+        raise HTTPException(status_code=400, detail="Documents cannot be empty")
+    if len(request.documents) > MAX_BATCH_DOCUMENTS:
         raise HTTPException(
-            status_code=500, 
-            detail="PDF file was not created successfully. Errors: " + "; ".join(errors)
+            status_code=413, detail=f"At most {MAX_BATCH_DOCUMENTS} documents per batch"
         )
+    contents = [validate_content(document) for document in request.documents]
+    if latex_worker.busy:
+        raise HTTPException(status_code=503, detail="Server is busy, try again later")
+
+    file_name = new_file_name()
+    template_config = request.template_config or TemplateConfig()
+    pdfs, errors = await run_batch_conversion(
+        file_name, contents, get_template_data(template_config)
+    )
+    if pdfs is None:
+        return conversion_failed(
+            file_name,
+            "PDF files were not created successfully. Errors: " + "; ".join(errors),
+            errors,
+        )
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for index, pdf in enumerate(pdfs, start=1):
+            archive.writestr(f"{file_name}_{index}.pdf", pdf)
+    return Response(
+        content=buffer.getvalue(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{file_name}.zip"'},
+    )
 
 
 @app.get("/health")
@@ -232,4 +992,4 @@ async def health_check():
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=False)
+    uvicorn.run(app, host="0.0.0.0", port=8000, reload=False, loop="uvloop", http="httptools")